@@ -1,14 +1,110 @@
 """
 ModelLab FastAPI application entrypoint.
 
-This module initializes the FastAPI app, configures CORS, and includes API routers.
+This module initializes the FastAPI app, configures CORS, includes API routers,
+and pre-warms models at startup.
 """
 from __future__ import annotations
 
-from fastapi import FastAPI
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator
+
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.routes.processing import MAX_REQUEST_BYTES
 from app.routes.processing import router as processing_router
+from app.services.lipsync import LipSyncService
+
+# Comma-separated model names to load at startup; set empty to disable.
+WARMUP_MODELS = [name for name in os.getenv("WARMUP_MODELS", "model1").split(",") if name.strip()]
+
+
+async def _warm_up_models() -> None:
+    for name in WARMUP_MODELS:
+        try:
+            await LipSyncService.warm_up(name.strip())
+        except Exception:
+            logging.exception("Failed to warm up model %s", name)
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies larger than `max_bytes` with 413.
+
+    Plain ASGI so it adds nothing to requests without a body. A declared
+    Content-Length over the limit is rejected before any body is read; other
+    bodies (e.g. chunked uploads) are counted as they stream in, and reading
+    stops once the limit is crossed, so oversized multipart uploads are never
+    fully spooled to disk.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside body parsing, where FastAPI turns it into the 413 response
+                    raise HTTPException(status_code=413, detail="Request body too large.")
+            return message
+
+        async def tracked_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as exc:
+            # Body read outside a route (nothing converted it to a response)
+            if exc.status_code != 413 or response_started:
+                raise
+            await self._reject(scope, receive, send)
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse(status_code=413, content={"detail": "Request body too large."})
+        await response(scope, receive, send)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Start model warm-up in the background so the server accepts requests
+    immediately while clone/session init happens off the request path.
+
+    On shutdown an unfinished warm-up is cancelled (killing an in-flight
+    `git clone`) and awaited so it isn't destroyed while still pending.
+    """
+    app.state.warmup_task = asyncio.create_task(_warm_up_models())
+    try:
+        yield
+    finally:
+        app.state.warmup_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await app.state.warmup_task
 
 
 def create_app() -> FastAPI:
@@ -17,7 +113,10 @@ def create_app() -> FastAPI:
     Returns:
         FastAPI: Configured FastAPI instance.
     """
-    app = FastAPI(title="ModelLab Backend", version="0.1.0")
+    app = FastAPI(title="ModelLab Backend", version="0.1.0", lifespan=lifespan)
+
+    # Added before CORS so CORS stays outermost and the 413 carries its headers
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)
 
     # Configure CORS for frontend access; adjust origins as needed.
     app.add_middleware(
@@ -1,34 +1,99 @@
 """Adapter to run the wav2lip-onnx-HQ repository inference script.
 
 This adapter finds a checkpoint under the repo's `checkpoints/` folder
-and invokes `inference_onnxModel.py` as a subprocess. It is a thin
-integration layer for development; in production you might import the
-repo as a package or rework the repo into reusable functions.
+and drives `inference_onnxModel.py` in-process: its `load_model` hook is
+pointed at a cached ONNXRuntime session so weights stay resident across
+requests. The script keeps its CLI args in module globals, so each
+concurrent call checks out its own imported copy of the script; all copies
+share the one session (`InferenceSession.run` is thread-safe), and calls
+run in parallel. If onnxruntime is not installed, the script doesn't expose
+the expected hooks, or WAV2LIP_INFERENCE=subprocess is set, we invoke the
+script as a subprocess instead (also in parallel).
 """
 from __future__ import annotations
 
+import asyncio
+import importlib.util
+import itertools
+import logging
+import os
 import shutil
 import subprocess
 import sys
+import threading
+from concurrent.futures import Executor
 from pathlib import Path
-from typing import Optional
+from types import ModuleType
+from typing import Dict, List, Optional, Set
+
+try:
+    import onnxruntime as ort
+except ImportError:  # optional; subprocess path still works without it
+    ort = None
+
+_PREFERRED_PROVIDERS = [
+    "TensorrtExecutionProvider",
+    "CUDAExecutionProvider",
+    "OpenVINOExecutionProvider",
+    "CPUExecutionProvider",
+]
+
+# Compiled EP artifacts (TensorRT engines, OpenVINO blobs) are persisted here
+# so kernel compilation is paid once per machine rather than per process.
+EP_CACHE_DIR = Path("./models/.ep_cache")
+
+# With `--workers N` every process would otherwise hold a private copy of the
+# weights. When enabled, checkpoints are re-saved once with weights as ONNX
+# external data, which ORT memory-maps on CPU so the kernel page cache shares
+# one copy across workers. Needs the `onnx` package, and caps graph
+# optimization at EXTENDED (see _session_options); set ORT_SHARE_WEIGHTS=0
+# to disable. (GPU EPs copy weights to device memory regardless.)
+SHARE_WEIGHTS = os.getenv("ORT_SHARE_WEIGHTS", "1") != "0"
+
+# ORT input type strings -> numpy dtype names
+_ORT_DTYPES: Dict[str, str] = {"tensor(float)": "float32", "tensor(float16)": "float16", "tensor(int64)": "int64"}
+
+# "inprocess" (default) or "subprocess". Both run concurrent tasks in
+# parallel; subprocess mode avoids sharing a process with the repo's script
+# (e.g. if it turns out to keep state outside its own module).
+INFERENCE_MODE = os.getenv("WAV2LIP_INFERENCE", "inprocess")
+
+# Loaded sessions (keyed by checkpoint) and idle imported
+# copies of the repo script. _LOCK only guards imports, session creation and
+# the pool itself; inference runs outside it.
+_SESSION_CACHE: Dict[Path, "_CastingSession"] = {}
+_MODULE_POOL: Dict[Path, List[ModuleType]] = {}
+_UNSUPPORTED_SCRIPTS: Set[Path] = set()
+_MODULE_IDS = itertools.count()
+_LOCK = threading.Lock()
+
+# Resolved checkpoints per repo. Misses aren't cached so a checkpoint that is
+# downloaded after startup is still picked up.
+_CHECKPOINT_CACHE: Dict[Path, Path] = {}
 
 
 def find_checkpoint(repo_path: Path) -> Optional[Path]:
+    cached = _CHECKPOINT_CACHE.get(repo_path)
+    if cached is not None:
+        return cached
+
     ckpt_dir = repo_path / "checkpoints"
     if not ckpt_dir.exists():
         return None
 
     # Prefer files with 'wav2lip' in the name, otherwise first .onnx
-    onnx_files = list(ckpt_dir.glob("*.onnx"))
+    # (skipping the external-data copies we generate ourselves)
+    onnx_files = [f for f in ckpt_dir.glob("*.onnx") if not f.name.endswith(".external.onnx")]
     if not onnx_files:
         return None
 
-    for f in onnx_files:
-        if "wav2lip" in f.name.lower():
-            return f
+    found = next((f for f in onnx_files if "wav2lip" in f.name.lower()), onnx_files[0])
+    _CHECKPOINT_CACHE[repo_path] = found
+    return found
 
-    return onnx_files[0]
+
+def _script_args(checkpoint: Path, face: str, audio: str, outfile: str) -> List[str]:
+    return ["--checkpoint_path", str(checkpoint), "--face", str(face), "--audio", str(audio), "--outfile", str(outfile)]
 
 
 def run_inference(repo_path: Path, checkpoint: Path, face: str, audio: str, outfile: str) -> str:
@@ -41,16 +106,307 @@ def run_inference(repo_path: Path, checkpoint: Path, face: str, audio: str, outf
         raise FileNotFoundError(f"inference script not found at {script}")
 
     python_bin = sys.executable or shutil.which("python")
-    cmd = [python_bin, str(script), "--checkpoint_path", str(checkpoint), "--face", str(face), "--audio", str(audio), "--outfile", str(outfile)]
+    cmd = [python_bin, str(script), *_script_args(checkpoint, face, audio, outfile)]
 
     # Run synchronously; caller should run in a thread if non-blocking required
     subprocess.run(cmd, check=True)
     return outfile
 
 
+async def run_inference_async(
+    repo_path: Path, checkpoint: Path, face: str, audio: str, outfile: str, executor: Optional[Executor] = None
+) -> str:
+    """Async variant of `run_inference` that awaits the subprocess on the
+    event loop instead of blocking a thread.
+
+    Event loops without subprocess support (the selector loop uvicorn uses
+    on Windows with --reload) fall back to `run_inference` on `executor`.
+
+    Raises subprocess.CalledProcessError on failure.
+    """
+    script = repo_path / "inference_onnxModel.py"
+    if not script.exists():
+        raise FileNotFoundError(f"inference script not found at {script}")
+
+    python_bin = sys.executable or shutil.which("python")
+    cmd = [python_bin, str(script), *_script_args(checkpoint, face, audio, outfile)]
+
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+    except NotImplementedError:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, run_inference, repo_path, checkpoint, face, audio, outfile)
+    _, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+    return outfile
+
+
+def _external_data_model(checkpoint: Path) -> Path:
+    """Return a copy of `checkpoint` whose weights live in a separate data file.
+
+    Created on first use next to the checkpoint as `<stem>.external.onnx` plus
+    `<stem>.external.onnx.data`. Conversion happens under an exclusive file
+    lock, so with several workers exactly one converts and the rest then map
+    the same data file. Falls back to the original checkpoint if `onnx` or
+    `fcntl` (i.e. on Windows) is unavailable, or if conversion fails.
+    """
+    target = checkpoint.with_name(f"{checkpoint.stem}.external.onnx")
+    if target.exists():
+        return target
+
+    try:
+        import fcntl
+        import onnx
+    except ImportError:
+        logging.info("onnx/fcntl unavailable; %s weights won't be shared across workers", checkpoint.name)
+        return checkpoint
+
+    data = target.with_name(f"{target.name}.data")
+    tmp = target.with_name(f"{target.name}.tmp")
+    lock_path = target.with_name(f"{target.name}.lock")
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # Another worker may have finished while we waited for the lock
+        if target.exists():
+            return target
+        try:
+            # onnx appends to an existing data file, so clear any leftover
+            # from an interrupted conversion first
+            data.unlink(missing_ok=True)
+            model = onnx.load(str(checkpoint))
+            onnx.save_model(
+                model,
+                str(tmp),
+                save_as_external_data=True,
+                all_tensors_to_one_file=True,
+                location=data.name,
+                size_threshold=1024,
+            )
+            # Publish the model file last; it's what other workers check for
+            os.replace(tmp, target)
+        except Exception:
+            logging.exception("Failed to convert %s to external data; loading it directly", checkpoint)
+            tmp.unlink(missing_ok=True)
+            data.unlink(missing_ok=True)
+            return checkpoint
+    return target
+
+
+def _session_options() -> "ort.SessionOptions":
+    opts = ort.SessionOptions()
+    if SHARE_WEIGHTS:
+        # ENABLE_ALL's layout transforms (NCHWc) and prepacking both copy
+        # weights into private per-process buffers, which would undo the
+        # sharing we get from the memory-mapped data file. EXTENDED keeps
+        # the fusions but leaves initializers in the mapping.
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        opts.add_session_config_entry("session.disable_prepacking", "1")
+    else:
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return opts
+
+
+def _providers() -> list:
+    """Available providers in preference order, with EP cache options set."""
+    cache_dir = str(EP_CACHE_DIR.resolve())
+    provider_options = {
+        "TensorrtExecutionProvider": {"trt_engine_cache_enable": True, "trt_engine_cache_path": cache_dir},
+        "OpenVINOExecutionProvider": {"cache_dir": cache_dir},
+    }
+    available = set(ort.get_available_providers())
+    providers = []
+    for name in _PREFERRED_PROVIDERS:
+        if name not in available:
+            continue
+        if name in provider_options:
+            EP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            providers.append((name, provider_options[name]))
+        else:
+            providers.append(name)
+    return providers
+
+
+class _CastingSession:
+    """Session proxy that casts each feed to the dtype the graph declares.
+
+    The repo's preprocessing produces float32 batches; when the checkpoint is
+    a float16 export this converts each batch in one vectorized pass (halving
+    the bytes handed to the EP) instead of failing. Arrays are also made
+    contiguous here so ORT doesn't copy them again internally. All other
+    attributes are forwarded to the wrapped session.
+    """
+
+    def __init__(self, session: "ort.InferenceSession") -> None:
+        import numpy as np
+
+        self._np = np
+        self._session = session
+        self._dtypes = {
+            inp.name: np.dtype(_ORT_DTYPES[inp.type]) for inp in session.get_inputs() if inp.type in _ORT_DTYPES
+        }
+
+    def run(self, output_names, input_feed, run_options=None):
+        feed = {}
+        for name, value in input_feed.items():
+            dtype = self._dtypes.get(name)
+            if dtype is not None and isinstance(value, self._np.ndarray):
+                value = self._np.ascontiguousarray(value, dtype=dtype)
+            feed[name] = value
+        return self._session.run(output_names, feed, run_options)
+
+    def __getattr__(self, name: str):
+        return getattr(self._session, name)
+
+
+def _get_session(checkpoint: Path) -> _CastingSession:
+    """Return the cached session for `checkpoint`, creating it on first use."""
+    session = _SESSION_CACHE.get(checkpoint)
+    if session is None:
+        model_path = _external_data_model(checkpoint) if SHARE_WEIGHTS else checkpoint
+        session = _CastingSession(
+            ort.InferenceSession(str(model_path), sess_options=_session_options(), providers=_providers() or None)
+        )
+        _SESSION_CACHE[checkpoint] = session
+    return session
+
+
+def _import_repo_module(script: Path, argv: List[str]) -> Optional[ModuleType]:
+    """Import a fresh copy of the repo's inference script. Call with _LOCK held.
+
+    The script parses CLI args at import time, so `sys.argv` is patched
+    for the duration of the import. Returns None if the script doesn't
+    expose the `parser`/`load_model`/`main` hooks we drive it through.
+    """
+    repo_dir = str(script.parent)
+    if repo_dir not in sys.path:
+        # The script imports sibling helper modules from the repo root
+        sys.path.insert(0, repo_dir)
+
+    spec = importlib.util.spec_from_file_location(f"_wav2lip_repo_{next(_MODULE_IDS)}", script)
+    module = importlib.util.module_from_spec(spec)
+    saved_argv = sys.argv
+    sys.argv = [str(script), *argv]
+    try:
+        spec.loader.exec_module(module)
+    except SystemExit as exc:
+        # argparse errors and sys.exit() would otherwise escape every
+        # `except Exception` fallback above us
+        raise RuntimeError(f"{script.name} exited during import: {exc}") from exc
+    finally:
+        sys.argv = saved_argv
+
+    if not all(hasattr(module, attr) for attr in ("parser", "load_model", "main")):
+        logging.warning("%s lacks in-process hooks; using subprocess inference", script)
+        return None
+    return module
+
+
+def _checkout_module(script: Path, argv: List[str]) -> Optional[ModuleType]:
+    """Take an idle copy of the script's module, importing a new one if none is free."""
+    with _LOCK:
+        if script in _UNSUPPORTED_SCRIPTS:
+            return None
+        idle = _MODULE_POOL.setdefault(script, [])
+        if idle:
+            return idle.pop()
+        module = _import_repo_module(script, argv)
+        if module is None:
+            _UNSUPPORTED_SCRIPTS.add(script)
+        return module
+
+
+def _checkin_module(script: Path, module: ModuleType) -> None:
+    with _LOCK:
+        _MODULE_POOL[script].append(module)
+
+
+def run_inference_in_process(repo_path: Path, checkpoint: Path, face: str, audio: str, outfile: str) -> str:
+    """Run the repo's inference loop in this process with a cached session.
+
+    Concurrent calls each use their own copy of the script module, so they
+    don't share its globals. Falls back to `run_inference` if the script
+    can't be driven in-process.
+    """
+    script = repo_path / "inference_onnxModel.py"
+    if not script.exists():
+        raise FileNotFoundError(f"inference script not found at {script}")
+
+    argv = _script_args(checkpoint, face, audio, outfile)
+    module = _checkout_module(script, argv)
+    if module is None:
+        return run_inference(repo_path, checkpoint, face, audio, outfile)
+
+    try:
+        with _LOCK:
+            session = _get_session(checkpoint)
+        module.args = module.parser.parse_args(argv)
+        module.load_model = lambda *_args, **_kwargs: session
+        module.main()
+    except SystemExit as exc:
+        # The script is a CLI; treat its exit like the subprocess path's
+        # CalledProcessError so callers fall back instead of dying
+        raise RuntimeError(f"{script.name} exited: {exc}") from exc
+    finally:
+        _checkin_module(script, module)
+    return outfile
+
+
+def _dummy_feed(session: _CastingSession) -> Dict[str, "object"]:
+    """Zero-filled inputs matching the session's inputs (symbolic dims -> 1)."""
+    import numpy as np
+
+    feed = {}
+    for inp in session.get_inputs():
+        shape = [dim if isinstance(dim, int) and dim > 0 else 1 for dim in inp.shape]
+        feed[inp.name] = np.zeros(shape, dtype=_ORT_DTYPES.get(inp.type, "float32"))
+    return feed
+
+
+def warm_up(repo_path: Path) -> None:
+    """Load the checkpoint's session and run one dummy batch through it.
+
+    This pays session creation, EP kernel compilation and CUDA context setup
+    ahead of the first real request. No-op without onnxruntime or a checkpoint.
+    """
+    if ort is None:
+        return
+    ckpt = find_checkpoint(repo_path)
+    if not ckpt:
+        return
+
+    with _LOCK:
+        session = _get_session(ckpt)
+    session.run(None, _dummy_feed(session))
+
+
 def run_repo_inference(repo_path: Path, face: str, audio: str, outfile: str) -> str:
     ckpt = find_checkpoint(repo_path)
     if not ckpt:
         raise FileNotFoundError(f"No ONNX checkpoint found in {repo_path / 'checkpoints'}")
 
-    return run_inference(repo_path, ckpt, face, audio, outfile)
+    if ort is None or INFERENCE_MODE == "subprocess":
+        return run_inference(repo_path, ckpt, face, audio, outfile)
+
+    return run_inference_in_process(repo_path, ckpt, face, audio, outfile)
+
+
+async def run_repo_inference_async(
+    repo_path: Path, face: str, audio: str, outfile: str, executor: Optional[Executor] = None
+) -> str:
+    """Async variant of `run_repo_inference`.
+
+    The subprocess path needs no thread at all; in-process inference is
+    CPU/GPU-bound and runs on `executor` (the loop's default if None).
+    """
+    ckpt = find_checkpoint(repo_path)
+    if not ckpt:
+        raise FileNotFoundError(f"No ONNX checkpoint found in {repo_path / 'checkpoints'}")
+
+    if ort is None or INFERENCE_MODE == "subprocess":
+        return await run_inference_async(repo_path, ckpt, face, audio, outfile, executor)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, run_inference_in_process, repo_path, ckpt, face, audio, outfile)
@@ -9,12 +9,20 @@ binaries out of git (use `models/` folder, Git LFS, or remote storage).
 """
 from __future__ import annotations
 
+from concurrent.futures import Executor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
+import asyncio
+import functools
+import os
 import subprocess
 import shutil
 import logging
+import tempfile
+import threading
+
+from app.models.adapters.wav2lip_adapter import run_repo_inference, run_repo_inference_async, warm_up
 
 DEFAULT_MODELS_DIR = Path("./models")
 
@@ -24,6 +32,56 @@ class ModelSpec:
     name: str
     loader: Callable[[Path], Any]
     path: Optional[Path] = None
+    git_url: Optional[str] = None
+
+
+def _inference_args(args: tuple, kwargs: dict) -> Tuple[str, str, str]:
+    """Extract (task_id, video, audio) from a model call's arguments."""
+    # Expecting kwargs: task_id, video, audio
+    task_id = kwargs.get("task_id") or args[0]
+    video = kwargs.get("video") or (args[1] if len(args) > 1 else None)
+    audio = kwargs.get("audio") or (args[2] if len(args) > 2 else None)
+
+    if not video or not audio:
+        raise ValueError("video and audio paths required for inference")
+    return task_id, video, audio
+
+
+def _result_outfile(task_id: str) -> str:
+    outfile = Path("./models").resolve() / "results" / f"{task_id}_lipsynced.mp4"
+    outfile.parent.mkdir(parents=True, exist_ok=True)
+    return str(outfile)
+
+
+# Model callables are built with functools.partial over these module-level
+# functions, so no closures are allocated per load and nothing is imported
+# on the inference path.
+def _run_repo(model_path: Path, *args, **kwargs) -> str:
+    # Try to use our wav2lip adapter; otherwise return path
+    try:
+        task_id, video, audio = _inference_args(args, kwargs)
+        outfile = _result_outfile(task_id)
+        run_repo_inference(model_path, video, audio, outfile)
+        return outfile
+    except Exception:
+        logging.exception("Repository adapter failed; falling back to stub for %s", model_path)
+        return str(model_path)
+
+
+async def _run_repo_async(model_path: Path, *args, executor: Optional[Executor] = None, **kwargs) -> str:
+    try:
+        task_id, video, audio = _inference_args(args, kwargs)
+        outfile = _result_outfile(task_id)
+        await run_repo_inference_async(model_path, video, audio, outfile, executor)
+        return outfile
+    except Exception:
+        logging.exception("Repository adapter failed; falling back to stub for %s", model_path)
+        return str(model_path)
+
+
+def _run_stub(model_path: Path, *args, **kwargs) -> str:
+    # For a real model this would perform inference and return path
+    return f"stub-result-for-{model_path.name}"
 
 
 class ModelManager:
@@ -43,6 +101,10 @@ class ModelManager:
         self.models_dir = models_dir
         self._specs: Dict[str, ModelSpec] = {}
         self._instances: Dict[str, Any] = {}
+        # Serializes first loads so startup warm-up and early requests don't
+        # clone or initialize the same model twice.
+        self._load_lock = threading.Lock()
+        self._clone_lock = asyncio.Lock()
 
         # Ensure models dir exists (may be gitignored)
         try:
@@ -55,8 +117,10 @@ class ModelManager:
         for name in ("model1", "model2", "model3"):
             self.register(name, self._stub_loader)
 
-    def register(self, name: str, loader: Callable[[Path], Any], path: Optional[Path] = None) -> None:
-        self._specs[name] = ModelSpec(name=name, loader=loader, path=path)
+    def register(
+        self, name: str, loader: Callable[[Path], Any], path: Optional[Path] = None, git_url: Optional[str] = None
+    ) -> None:
+        self._specs[name] = ModelSpec(name=name, loader=loader, path=path, git_url=git_url)
 
     def register_from_git(self, name: str, git_url: str, path: Optional[Path] = None) -> None:
         """Register a model whose code/weights live in a Git repository.
@@ -68,36 +132,28 @@ class ModelManager:
         """
 
         target_path = path or (self.models_dir / name)
+        self.register(name, functools.partial(self._git_loader, git_url=git_url), path=target_path, git_url=git_url)
 
-        def _git_loader(model_path: Path) -> Callable[..., str]:
-            # Ensure repository is present (lazy clone)
-            self._ensure_repo_cloned(model_path, git_url)
-
-            def _run_repo(*args, **kwargs) -> str:
-                # Try to use our wav2lip adapter if available; otherwise return path
-                try:
-                    from app.models.adapters.wav2lip_adapter import run_repo_inference
+    @staticmethod
+    def _clone_dir(model_path: Path) -> Path:
+        """Make an empty sibling directory for `git clone` to fill.
 
-                    # Expecting kwargs: task_id, video, audio
-                    task_id = kwargs.get("task_id") or args[0]
-                    video = kwargs.get("video") or (args[1] if len(args) > 1 else None)
-                    audio = kwargs.get("audio") or (args[2] if len(args) > 2 else None)
-
-                    if not video or not audio:
-                        raise ValueError("video and audio paths required for inference")
-
-                    outfile = str(Path("./models").resolve() / "results" / f"{task_id}_lipsynced.mp4")
-                    Path(outfile).parent.mkdir(parents=True, exist_ok=True)
-
-                    run_repo_inference(model_path, video, audio, outfile)
-                    return outfile
-                except Exception:
-                    logging.exception("Repository adapter failed; falling back to stub for %s", model_path)
-                    return str(model_path)
-
-            return _run_repo
+        Cloning next to the target and renaming it into place means other
+        workers never see a half-cloned repo at `model_path`.
+        """
+        model_path.parent.mkdir(parents=True, exist_ok=True)
+        return Path(tempfile.mkdtemp(prefix=f".{model_path.name}.clone-", dir=model_path.parent))
 
-        self.register(name, _git_loader, path=target_path)
+    @staticmethod
+    def _publish_clone(clone_dir: Path, model_path: Path) -> None:
+        """Move a finished clone into place, deferring to one that won the race."""
+        try:
+            os.replace(clone_dir, model_path)
+        except OSError:
+            shutil.rmtree(clone_dir, ignore_errors=True)
+            # Another worker published first; its clone is as good as ours
+            if not (model_path.exists() and any(model_path.iterdir())):
+                raise
 
     def _ensure_repo_cloned(self, model_path: Path, git_url: str) -> None:
         """Clone the git repo to model_path if it's not already present.
@@ -113,17 +169,64 @@ class ModelManager:
         if not git_bin:
             raise RuntimeError("git binary not found on PATH; please install git or clone manually")
 
-        model_path_parent = model_path.parent
-        model_path_parent.mkdir(parents=True, exist_ok=True)
-
-        cmd = [git_bin, "clone", git_url, str(model_path)]
+        clone_dir = self._clone_dir(model_path)
+        cmd = [git_bin, "clone", git_url, str(clone_dir)]
         logging.info("Cloning model repo %s -> %s", git_url, model_path)
         try:
             subprocess.run(cmd, check=True)
         except subprocess.CalledProcessError as exc:
+            shutil.rmtree(clone_dir, ignore_errors=True)
             raise RuntimeError(f"Failed to clone {git_url}: {exc}") from exc
+        self._publish_clone(clone_dir, model_path)
 
-    def get(self, name: str) -> Any:
+    async def _ensure_repo_cloned_async(
+        self, model_path: Path, git_url: str, executor: Optional[Executor] = None
+    ) -> None:
+        """Async variant of `_ensure_repo_cloned` that awaits `git clone` on the
+        event loop rather than tying up a thread for the whole clone.
+
+        Event loops without subprocess support (the selector loop uvicorn uses
+        on Windows with --reload) fall back to the sync clone on `executor`.
+        """
+
+        if model_path.exists() and any(model_path.iterdir()):
+            return
+
+        git_bin = shutil.which("git")
+        if not git_bin:
+            raise RuntimeError("git binary not found on PATH; please install git or clone manually")
+
+        loop = asyncio.get_running_loop()
+        clone_dir = self._clone_dir(model_path)
+        cmd = [git_bin, "clone", git_url, str(clone_dir)]
+        logging.info("Cloning model repo %s -> %s", git_url, model_path)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+            )
+        except NotImplementedError:
+            shutil.rmtree(clone_dir, ignore_errors=True)
+            await loop.run_in_executor(executor, self._ensure_repo_cloned, model_path, git_url)
+            return
+        try:
+            _, stderr = await proc.communicate()
+        except asyncio.CancelledError:
+            proc.kill()
+            await proc.wait()
+            shutil.rmtree(clone_dir, ignore_errors=True)
+            raise
+        if proc.returncode != 0:
+            shutil.rmtree(clone_dir, ignore_errors=True)
+            raise RuntimeError(f"Failed to clone {git_url}: {stderr.decode(errors='replace').strip()}")
+        await loop.run_in_executor(executor, self._publish_clone, clone_dir, model_path)
+
+    async def get_async(self, name: str, executor: Optional[Executor] = None) -> Any:
+        """Async variant of `get`.
+
+        Git-backed models are cloned with an async subprocess first; the
+        remaining (blocking) loader work runs on `executor` (the loop's
+        default if None).
+        """
         if name in self._instances:
             return self._instances[name]
 
@@ -131,23 +234,53 @@ class ModelManager:
         if not spec:
             raise KeyError(f"Model not registered: {name}")
 
-        model_path = spec.path or (self.models_dir / name)
-        instance = spec.loader(model_path)
-        self._instances[name] = instance
-        return instance
+        if spec.git_url:
+            async with self._clone_lock:
+                await self._ensure_repo_cloned_async(spec.path or (self.models_dir / name), spec.git_url, executor)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.get, name)
+
+    def get(self, name: str) -> Any:
+        if name in self._instances:
+            return self._instances[name]
+
+        with self._load_lock:
+            if name in self._instances:
+                return self._instances[name]
+
+            spec = self._specs.get(name)
+            if not spec:
+                raise KeyError(f"Model not registered: {name}")
+
+            model_path = spec.path or (self.models_dir / name)
+            instance = spec.loader(model_path)
+            self._instances[name] = instance
+            return instance
 
     # --- example loaders ---
+    def _git_loader(self, model_path: Path, git_url: str) -> Callable[..., str]:
+        """Clone (if needed) and warm up a git-backed model, returning its runner."""
+        # Ensure repository is present (lazy clone)
+        self._ensure_repo_cloned(model_path, git_url)
+
+        # Load weights now rather than on the first inference
+        try:
+            warm_up(model_path)
+        except Exception:
+            logging.exception("Warm-up failed for %s; inference will load lazily", model_path)
+
+        runner = functools.partial(_run_repo, model_path)
+        # Async callers (LipSyncService) use this to skip the threadpool hop
+        runner.run_async = functools.partial(_run_repo_async, model_path)
+        return runner
+
     def _stub_loader(self, model_path: Path) -> Callable[..., str]:
         """Return a tiny stub 'model' that pretends to process inputs.
 
         This keeps the rest of the codebase runnable without real models.
         """
-
-        def _run_stub(*args, **kwargs) -> str:
-            # For a real model this would perform inference and return path
-            return f"stub-result-for-{model_path.name}"
-
-        return _run_stub
+        return functools.partial(_run_stub, model_path)
 
 
 # Single shared manager instance used by the app
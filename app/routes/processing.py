@@ -5,13 +5,18 @@ Defines endpoints to submit a processing task and retrieve results.
 """
 from __future__ import annotations
 
+import asyncio
+import json
+import os
+import shutil
+import subprocess
 import uuid
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Optional, Set
 
-import aiofiles
 from fastapi import APIRouter, BackgroundTasks, File, HTTPException, UploadFile
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response
 
 from app.schemas.processing import (
     ModelChoice,
@@ -23,25 +28,102 @@ from app.services.lipsync import LipSyncService
 UPLOAD_DIR = Path("/tmp/uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# 8 MiB copy/buffer size to amortize read/write syscalls on large uploads
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Per-file upload limit, checked against UploadFile.size. The whole request
+# (two files plus form overhead) is capped by BodySizeLimitMiddleware while
+# the body streams in.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+MAX_REQUEST_BYTES = 2 * MAX_UPLOAD_BYTES + 64 * 1024
+
+# Upper bound on each ffprobe run; slower inputs are rejected as unreadable
+FFPROBE_TIMEOUT = float(os.getenv("FFPROBE_TIMEOUT", "10"))
+
+# Results below this size are read into memory and sent in one response body
+SMALL_RESULT_BYTES = 64 * 1024
+
 router = APIRouter()
 
+# Every status poll before completion gets the same body, so serialize it
+# once instead of building and encoding a ResultStatusResponse per request.
+_PROCESSING_BODY = ResultStatusResponse(status="processing").model_dump_json().encode()
+
+
+def _sniff_audio(head: bytes) -> Optional[str]:
+    """Return the audio file extension implied by the leading bytes, if any."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return ".wav"
+    # ID3v2 tag, or a bare MPEG audio frame sync (11 set bits)
+    if head[:3] == b"ID3" or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return ".mp3"
+    return None
+
+
+def _is_mp4(head: bytes) -> bool:
+    # ISO base media files open with a box whose type is `ftyp`
+    return len(head) >= 8 and head[4:8] == b"ftyp"
+
+
+async def _peek(file: UploadFile, size: int = 16) -> bytes:
+    head = await file.read(size)
+    await file.seek(0)
+    return head
+
+
+def _probe_stream_types(path: Path) -> Optional[Set[str]]:
+    """Return the stream codec types ffprobe finds in `path`.
+
+    Returns None when ffprobe isn't installed, so validation is skipped.
+    Blocking; run it in the threadpool. Raises subprocess.TimeoutExpired if
+    ffprobe takes longer than FFPROBE_TIMEOUT seconds.
+    """
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return None
+
+    proc = subprocess.run(
+        [ffprobe, "-v", "error", "-show_entries", "stream=codec_type", "-of", "json", str(path)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        timeout=FFPROBE_TIMEOUT,
+    )
+    if proc.returncode != 0:
+        return set()
+    try:
+        streams = json.loads(proc.stdout).get("streams", [])
+    except ValueError:
+        return set()
+    return {s.get("codec_type") for s in streams}
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Upload too large. Maximum size is {MAX_UPLOAD_BYTES} bytes per file.",
+    )
+
+
+def _copy_upload(file: UploadFile, dest: Path) -> None:
+    with open(dest, "wb", buffering=COPY_CHUNK_SIZE) as out:
+        shutil.copyfileobj(file.file, out, COPY_CHUNK_SIZE)
+
 
 async def _save_upload(file: UploadFile, dest: Path) -> None:
-    """Save an uploaded file asynchronously to the specified destination.
+    """Save an uploaded file to the specified destination.
+
+    The copy runs as a single blocking call in the threadpool rather than one
+    async dispatch per chunk. Sizes are already enforced by the time this
+    runs (BodySizeLimitMiddleware and the UploadFile.size check).
 
     Args:
         file: The uploaded file to save.
         dest: The destination path.
     """
-    async with aiofiles.open(dest, "wb") as out:
-        while True:
-            chunk = await file.read(1024 * 1024)
-            if not chunk:
-                break
-            await out.write(chunk)
+    await run_in_threadpool(_copy_upload, file, dest)
 
 
-@router.post("/process/", response_model=ProcessResponse)
+@router.post("/process/", response_model=ProcessResponse, status_code=202)
 async def process_media(
     background_tasks: BackgroundTasks,
     video_file: Annotated[UploadFile, File(description="Input video file (mp4)")],
@@ -57,11 +139,19 @@ async def process_media(
     Returns:
         A JSON response containing the generated task ID.
     """
-    # Validate content types
-    if video_file.content_type not in {"video/mp4"}:
+    # Reject an oversized file before copying anything (the body as a whole
+    # was already capped while it was received)
+    for upload in (video_file, audio_file):
+        if upload.size is not None and upload.size > MAX_UPLOAD_BYTES:
+            raise _too_large()
+
+    # Validate formats from the file headers; client content types can't be trusted
+    video_head, audio_head = await asyncio.gather(_peek(video_file), _peek(audio_file))
+    if not _is_mp4(video_head):
         raise HTTPException(status_code=400, detail="Invalid video format. Only mp4 allowed.")
 
-    if audio_file.content_type not in {"audio/wav", "audio/x-wav", "audio/mpeg"}:
+    extension = _sniff_audio(audio_head)
+    if extension is None:
         raise HTTPException(
             status_code=400,
             detail="Invalid audio format. Only wav or mp3 allowed.",
@@ -73,21 +163,40 @@ async def process_media(
     task_dir.mkdir(parents=True, exist_ok=True)
 
     video_path = task_dir / "input.mp4"
-    audio_path = task_dir / "input_audio"
+    audio_path = (task_dir / "input_audio").with_suffix(extension)
 
-    # Preserve audio extension if available
-    extension = Path(audio_file.filename or "").suffix or (
-        ".mp3" if audio_file.content_type == "audio/mpeg" else ".wav"
-    )
-    audio_path = audio_path.with_suffix(extension)
-
-    await _save_upload(video_file, video_path)
-    await _save_upload(audio_file, audio_path)
+    # Each UploadFile has its own spooled backing file, so save both concurrently
+    try:
+        await asyncio.gather(
+            _save_upload(video_file, video_path),
+            _save_upload(audio_file, audio_path),
+        )
+    except Exception:
+        await run_in_threadpool(shutil.rmtree, task_dir, True)
+        raise
+
+    # Deeper check when ffprobe is available: make sure the decoder actually
+    # finds the streams we need before spending an inference run on them.
+    try:
+        video_streams, audio_streams = await asyncio.gather(
+            run_in_threadpool(_probe_stream_types, video_path),
+            run_in_threadpool(_probe_stream_types, audio_path),
+        )
+    except subprocess.TimeoutExpired:
+        await run_in_threadpool(shutil.rmtree, task_dir, True)
+        raise HTTPException(status_code=400, detail="Could not read uploaded media (probe timed out).")
+    if video_streams is not None and "video" not in video_streams:
+        await run_in_threadpool(shutil.rmtree, task_dir, True)
+        raise HTTPException(status_code=400, detail="Video file has no decodable video stream.")
+    if audio_streams is not None and "audio" not in audio_streams:
+        await run_in_threadpool(shutil.rmtree, task_dir, True)
+        raise HTTPException(status_code=400, detail="Audio file has no decodable audio stream.")
 
     # Schedule background processing
     background_tasks.add_task(LipSyncService.process_task, task_id, video_path, audio_path, model_choice)
 
-    return JSONResponse(status_code=202, content=ProcessResponse(task_id=task_id).model_dump())
+    # Plain dict matches ProcessResponse; skip building a model just to dump it
+    return JSONResponse(status_code=202, content={"task_id": task_id})
 
 
 @router.get("/result/{task_id}")
@@ -97,17 +206,33 @@ async def get_result(task_id: str):
     - If processing is ongoing, returns a status JSON.
     - If finished, streams the resulting mp4 file.
     """
-    status = LipSyncService.get_status(task_id)
+    status = await LipSyncService.get_status(task_id)
     if status != "finished":
-        return ResultStatusResponse(status=status)
+        return Response(content=_PROCESSING_BODY, media_type="application/json")
 
-    result_path = LipSyncService.get_result_path(task_id)
-    if not result_path.exists():
+    # Existence and size are recorded at write time, so no blocking stat on
+    # the event loop
+    info = await LipSyncService.get_task(task_id)
+    if info is None or info.result_path is None:
         raise HTTPException(status_code=404, detail="Result file not found.")
 
-    # Stream the file
+    filename = f"{task_id}_lipsynced.mp4"
+
+    # Small results go out in a single write rather than chunked streaming
+    if info.result_size is not None and info.result_size < SMALL_RESULT_BYTES:
+        try:
+            content = await run_in_threadpool(info.result_path.read_bytes)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Result file not found.")
+        return Response(
+            content=content,
+            media_type="video/mp4",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    # Stream larger files (FileResponse uses sendfile where available)
     return FileResponse(
-        path=result_path,
+        path=info.result_path,
         media_type="video/mp4",
-        filename=f"{task_id}_lipsynced.mp4",
+        filename=filename,
     )
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from enum import Enum
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ModelChoice(str, Enum):
@@ -16,10 +16,14 @@ class ModelChoice(str, Enum):
 class ProcessResponse(BaseModel):
     """Response model for a submitted processing task."""
 
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     task_id: str = Field(..., description="Unique identifier for the processing task")
 
 
 class ResultStatusResponse(BaseModel):
     """Response model for task status when result isn't ready."""
 
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     status: str = Field(..., description='Current status: "processing" or "finished"')
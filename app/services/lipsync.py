@@ -1,39 +1,44 @@
-"""Mock lip-sync service for processing tasks.
+"""Lip-sync service for processing tasks.
 
-Provides asynchronous background processing simulation and task state tracking.
+Runs the selected model via the ModelManager in the background (falling back
+to a mock placeholder result) and tracks task state.
 """
 from __future__ import annotations
 
 import asyncio
-from dataclasses import dataclass
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Literal, Optional
+from typing import Optional
 
-from app.schemas.processing import ModelChoice
 from app.models.manager import DEFAULT_MANAGER
-from concurrent.futures import ThreadPoolExecutor
-import functools
-
+from app.schemas.processing import ModelChoice
+from app.services.task_store import Status, TaskInfo, TaskStore, create_store
 
-Status = Literal["processing", "finished"]
+# Shared pool for blocking model work (loading and inference); reused across
+# tasks so we don't pay thread spawn/teardown per request, and passed down to
+# the manager/adapter so LIPSYNC_MAX_WORKERS caps all of it. Request-path file
+# I/O in the routes uses Starlette's run_in_threadpool instead.
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LIPSYNC_MAX_WORKERS", "0")) or max(4, os.cpu_count() or 1),
+    thread_name_prefix="lipsync",
+)
 
+_PLACEHOLDER_MP4 = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"
 
-@dataclass
-class TaskInfo:
-    """Internal representation of a processing task."""
 
-    task_id: str
-    video_path: Path
-    audio_path: Path
-    model_choice: ModelChoice
-    status: Status = "processing"
-    result_path: Optional[Path] = None
+def _result_size(path: Path) -> Optional[int]:
+    """Size of `path` if it is a regular file, else None."""
+    return path.stat().st_size if path.is_file() else None
 
 
 class LipSyncService:
-    """Service to manage mock lip-sync processing tasks."""
+    """Service to manage lip-sync processing tasks."""
 
-    _tasks: Dict[str, TaskInfo] = {}
+    # Backend chosen by TASK_STORE_URL; use a shared one with multiple workers
+    _store: TaskStore = create_store()
     _results_dir: Path = Path("/tmp/uploads/results")
     _results_dir.mkdir(parents=True, exist_ok=True)
 
@@ -41,7 +46,7 @@ class LipSyncService:
     async def process_task(
         cls, task_id: str, video_path: Path, audio_path: Path, model_choice: ModelChoice
     ) -> None:
-        """Simulate asynchronous processing and produce a mock mp4 file.
+        """Run the selected model and record its result (or a mock mp4 file).
 
         Args:
             task_id: Unique identifier for the task.
@@ -51,48 +56,69 @@ class LipSyncService:
         """
         # Register task
         info = TaskInfo(task_id, video_path, audio_path, model_choice)
-        cls._tasks[task_id] = info
+        await cls._store.put(info)
 
-        # Simulate model loading and inference using the ModelManager.
+        # Load the model via the ModelManager. A first load may clone a repo or
+        # wait on startup warm-up; get_async keeps both off the event loop.
         try:
-            model = DEFAULT_MANAGER.get(model_choice.value)
+            model = await DEFAULT_MANAGER.get_async(model_choice.value, executor=_EXECUTOR)
         except KeyError:
             # If model isn't registered treat as processing failure; for now
             # we'll still create a stub result so API consumers can be tested.
             model = None
+        except Exception:
+            # Clone/load failures must not leave the task stuck in "processing"
+            logging.exception("Failed to load model %s; using mock result", model_choice.value)
+            model = None
 
-        # Simulate computation delay (replace with real inference in future)
-        await asyncio.sleep(2.0)
+        if model is None:
+            # Simulate computation delay for the mock-only path
+            await asyncio.sleep(2.0)
 
-        # If model is callable, run it. It may perform blocking work (subprocess)
-        # so execute in a threadpool. If it returns a path to an output file,
-        # use that as the final result. On any error, fall back to the mock file.
+        # If model is callable, run it. Prefer its async entrypoint when it has
+        # one; otherwise it may block, so execute it in the threadpool. If it
+        # returns a path to an output file, use that as the final result. On
+        # any error, fall back to the mock file.
         result_path: Optional[Path] = None
+        result_size: Optional[int] = None
+        loop = asyncio.get_running_loop()
 
         if callable(model):
-            loop = asyncio.get_running_loop()
-            with ThreadPoolExecutor(max_workers=1) as pool:
-                func = functools.partial(model, task_id=task_id, video=str(video_path), audio=str(audio_path))
-                try:
-                    returned = await loop.run_in_executor(pool, func)
-                    if isinstance(returned, str):
-                        p = Path(returned)
-                        if p.exists():
-                            result_path = p
-                except Exception:
-                    # Adapter failed; we'll fallback to mock result below
-                    pass
+            kwargs = {"task_id": task_id, "video": str(video_path), "audio": str(audio_path)}
+            run_async = getattr(model, "run_async", None)
+            try:
+                if run_async is not None:
+                    returned = await run_async(**kwargs, executor=_EXECUTOR)
+                else:
+                    returned = await loop.run_in_executor(_EXECUTOR, functools.partial(model, **kwargs))
+                if isinstance(returned, str):
+                    p = Path(returned)
+                    result_size = await loop.run_in_executor(_EXECUTOR, _result_size, p)
+                    if result_size is not None:
+                        result_path = p
+            except Exception:
+                # Adapter failed; we'll fallback to mock result below
+                pass
 
         # If model didn't produce a real result, create a mock placeholder
         if not result_path:
             result_path = cls._results_dir / f"{task_id}.mp4"
-            result_path.write_bytes(b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom")
+            result_size = await loop.run_in_executor(_EXECUTOR, result_path.write_bytes, _PLACEHOLDER_MP4)
 
         info.result_path = result_path
+        info.result_size = result_size
         info.status = "finished"
+        await cls._store.put(info)
+
+    @classmethod
+    async def warm_up(cls, name: str) -> None:
+        """Load a model ahead of its first task, on the service's executor."""
+        await DEFAULT_MANAGER.get_async(name, executor=_EXECUTOR)
 
+    # Accessors are async so they can await the store and be used as FastAPI
+    # dependencies without Starlette dispatching them to the threadpool.
     @classmethod
-    def get_status(cls, task_id: str) -> Status:
+    async def get_status(cls, task_id: str) -> Status:
         """Get the current status of a task.
 
         Args:
@@ -102,15 +128,12 @@ class LipSyncService:
             Task status: "processing" or "finished". Unknown tasks are treated as processing
             until they are registered/created.
         """
-        info = cls._tasks.get(task_id)
+        info = await cls._store.get(task_id)
         if not info:
             return "processing"
         return info.status
 
     @classmethod
-    def get_result_path(cls, task_id: str) -> Path:
-        """Get the path to the result file for a task."""
-        info = cls._tasks.get(task_id)
-        if info and info.result_path:
-            return info.result_path
-        return cls._results_dir / f"{task_id}.mp4"
+    async def get_task(cls, task_id: str) -> Optional[TaskInfo]:
+        """Get the full task record, or None if the task is unknown."""
+        return await cls._store.get(task_id)
@@ -0,0 +1,210 @@
+"""Task state storage backends for the lip-sync service.
+
+The default store keeps tasks in process memory, which only works with a
+single uvicorn worker. When running `--workers N`, point `TASK_STORE_URL` at
+a store every worker can reach so result polls can land on any worker:
+
+    TASK_STORE_URL=redis://localhost:6379/0   # requires the `redis` package
+    TASK_STORE_URL=file:///srv/modellab/tasks # JSON files on a shared filesystem
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Literal, Optional, Protocol
+from urllib.parse import urlparse
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.schemas.processing import ModelChoice
+
+Status = Literal["processing", "finished"]
+
+
+@dataclass
+class TaskInfo:
+    """Internal representation of a processing task."""
+
+    task_id: str
+    video_path: Path
+    audio_path: Path
+    model_choice: ModelChoice
+    status: Status = "processing"
+    result_path: Optional[Path] = None
+    result_size: Optional[int] = None
+
+    def to_record(self) -> Dict[str, str]:
+        """Flatten to string fields (suitable for JSON or a Redis hash)."""
+        return {
+            "task_id": self.task_id,
+            "video_path": str(self.video_path),
+            "audio_path": str(self.audio_path),
+            "model_choice": self.model_choice.value,
+            "status": self.status,
+            "result_path": str(self.result_path) if self.result_path else "",
+            "result_size": str(self.result_size) if self.result_size is not None else "",
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, str]) -> "TaskInfo":
+        return cls(
+            task_id=record["task_id"],
+            video_path=Path(record["video_path"]),
+            audio_path=Path(record["audio_path"]),
+            model_choice=ModelChoice(record["model_choice"]),
+            status=record["status"],  # type: ignore[arg-type]
+            result_path=Path(record["result_path"]) if record.get("result_path") else None,
+            result_size=int(record["result_size"]) if record.get("result_size") else None,
+        )
+
+
+class TaskStore(Protocol):
+    """Minimal async interface for persisting task state."""
+
+    async def put(self, info: TaskInfo) -> None: ...
+
+    async def get(self, task_id: str) -> Optional[TaskInfo]: ...
+
+
+class InMemoryStore:
+    """Process-local store; only correct with a single worker.
+
+    Holds at most `max_tasks` tasks. Once full, the oldest finished task is
+    evicted and its result file and upload directory deleted, so
+    long-running services don't grow without bound. Tasks still processing
+    are never evicted (their inputs are in use), nor is the task being put,
+    so a backlog of more than `max_tasks` queued tasks temporarily exceeds
+    the cap. Mutations take a lock so the store stays consistent on
+    free-threaded builds and when touched from worker threads.
+    """
+
+    def __init__(self, max_tasks: int = 10_000) -> None:
+        self.max_tasks = max_tasks
+        self._tasks: "OrderedDict[str, TaskInfo]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def put(self, info: TaskInfo) -> None:
+        evicted: List[TaskInfo] = []
+        with self._lock:
+            self._tasks[info.task_id] = info
+            # A just-finished task becomes the newest, so its result outlives
+            # older ones until the client has had a chance to fetch it
+            self._tasks.move_to_end(info.task_id)
+            excess = len(self._tasks) - self.max_tasks
+            if excess > 0:
+                # Oldest first; in-flight tasks and the one being put are skipped
+                finished = (
+                    task_id
+                    for task_id, old in self._tasks.items()
+                    if old.status != "processing" and task_id != info.task_id
+                )
+                for task_id in list(itertools.islice(finished, excess)):
+                    evicted.append(self._tasks.pop(task_id))
+
+        if evicted:
+            await run_in_threadpool(self._remove_evicted, evicted)
+
+    def _remove_evicted(self, evicted: List[TaskInfo]) -> None:
+        with self._lock:
+            # A task put again since its eviction owns its files again
+            evicted = [old for old in evicted if old.task_id not in self._tasks]
+        _remove_task_files(evicted)
+
+    async def get(self, task_id: str) -> Optional[TaskInfo]:
+        with self._lock:
+            return self._tasks.get(task_id)
+
+
+def _remove_task_files(tasks: List[TaskInfo]) -> None:
+    """Best-effort cleanup of evicted tasks' results and upload directories."""
+    for info in tasks:
+        if info.result_path:
+            try:
+                info.result_path.unlink(missing_ok=True)
+            except OSError:
+                logging.warning("Could not delete result %s of evicted task %s", info.result_path, info.task_id)
+        # Uploads live in `<UPLOAD_DIR>/<task_id>/`; don't touch any other parent
+        task_dir = info.video_path.parent
+        if task_dir.name == info.task_id:
+            shutil.rmtree(task_dir, ignore_errors=True)
+
+
+class FileStore:
+    """Stores each task as `<root>/<task_id>.json` on a shared filesystem."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, task_id: str) -> Path:
+        return self.root / f"{task_id}.json"
+
+    def _write(self, info: TaskInfo) -> None:
+        # Write then rename so readers never observe a partial file
+        path = self._path(info.task_id)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(info.to_record()))
+        os.replace(tmp, path)
+
+    def _read(self, task_id: str) -> Optional[TaskInfo]:
+        try:
+            record = json.loads(self._path(task_id).read_text())
+        except FileNotFoundError:
+            return None
+        return TaskInfo.from_record(record)
+
+    async def put(self, info: TaskInfo) -> None:
+        await run_in_threadpool(self._write, info)
+
+    async def get(self, task_id: str) -> Optional[TaskInfo]:
+        return await run_in_threadpool(self._read, task_id)
+
+
+class RedisStore:
+    """Stores each task as a Redis hash at `task:<task_id>`."""
+
+    def __init__(self, url: str) -> None:
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("TASK_STORE_URL uses redis but the `redis` package is not installed") from exc
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+
+    @staticmethod
+    def _key(task_id: str) -> str:
+        return f"task:{task_id}"
+
+    async def put(self, info: TaskInfo) -> None:
+        await self._redis.hset(self._key(info.task_id), mapping=info.to_record())
+
+    async def get(self, task_id: str) -> Optional[TaskInfo]:
+        record = await self._redis.hgetall(self._key(task_id))
+        return TaskInfo.from_record(record) if record else None
+
+
+def create_store(url: Optional[str] = None) -> TaskStore:
+    """Build a store from a URL (defaults to the `TASK_STORE_URL` env var).
+
+    Supported schemes: `memory://` (default), `file://<dir>`, `redis://`,
+    `rediss://`.
+    """
+    url = url if url is not None else os.getenv("TASK_STORE_URL", "")
+    max_tasks = int(os.getenv("TASK_STORE_MAX_TASKS", "10000"))
+    if not url:
+        return InMemoryStore(max_tasks)
+
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return InMemoryStore(max_tasks)
+    if scheme == "file":
+        return FileStore(Path(urlparse(url).path))
+    if scheme in {"redis", "rediss"}:
+        return RedisStore(url)
+    raise ValueError(f"Unsupported TASK_STORE_URL scheme: {scheme!r}")